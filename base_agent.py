@@ -1,18 +1,47 @@
 from langchain_openai import ChatOpenAI
 from langchain_core.prompts.prompt import PromptTemplate
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional, Tuple
+import asyncio
 import json
 import os
+import sys
+import tempfile
+import time
+import uuid
 from datetime import datetime
 from dotenv import load_dotenv
-from tools import ShoppingCart
+from tools import ShoppingCart, DeadlineExceeded, remaining_time
+from tracing import tracer
+from responses import FALLBACK_RESPONSE
 
 load_dotenv()
 
+SESSION_IDLE_SECONDS = float(os.getenv('RENKO_SESSION_IDLE_SECONDS', 900))
+
+class ConversationTurn:
+    """A single user/assistant exchange, kept compact while the session is in memory"""
+    __slots__ = ("timestamp", "user", "assistant")
+
+    def __init__(self, user: str, assistant: str, timestamp: Optional[float] = None):
+        self.timestamp = time.time() if timestamp is None else timestamp
+        self.user = user
+        self.assistant = assistant
+
+    def to_dict(self) -> Dict[str, str]:
+        return {
+            "timestamp": datetime.fromtimestamp(self.timestamp).isoformat(),
+            "user": self.user,
+            "assistant": self.assistant
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, str]) -> "ConversationTurn":
+        return cls(data["user"], data["assistant"], datetime.fromisoformat(data["timestamp"]).timestamp())
+
 class RenkoChatAgent:
-    def __init__(self, store_name: str):
-        """Initialize the chat agent for a specific store"""
-        self.store_name = store_name
+    def __init__(self, store_name: str, chat_histories_dir: Optional[str] = None):
+        """Initialize the chat agent for a specific store, optionally saving history outside chat_histories/"""
+        self.store_name = sys.intern(store_name)
         self.llm = ChatOpenAI(
             model="gpt-4o-mini",
             temperature=0.3,
@@ -23,16 +52,65 @@ class RenkoChatAgent:
         self.config_dir = os.path.join(self.base_path, "config", "store_configs")
         
         # Create store-specific chat history directory
-        self.chat_histories_dir = os.path.join(self.base_path, "chat_histories", self.store_name)
+        self.chat_histories_dir = chat_histories_dir or os.path.join(self.base_path, "chat_histories", self.store_name)
         os.makedirs(self.chat_histories_dir, exist_ok=True)
         
+        self._config_mtime: Optional[int] = None
         self.store_data = self._load_store_data()
-        self.conversation_history: List[Dict[str, str]] = []
+        self._store_sections: Optional[Tuple[str, str]] = None
+        self._conversation_history: Optional[List[ConversationTurn]] = []
+        # Number of turns the history file is known to hold
+        self._saved_turns = 0
+        self.session_start = datetime.now().isoformat()
+        self.last_active = time.monotonic()
         self.prompt_template = self._create_prompt_template()
         self.shopping_cart = ShoppingCart()
         
-        # Include store name in chat history filename
-        self.chat_history_file = f"{self.store_name}_chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
+        # Include store name in chat history filename, with a random suffix so agents created in
+        # the same second never share a file that a spilled session is restored from
+        self.chat_history_file = (f"{self.store_name}_chat_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
+                                  f"_{uuid.uuid4().hex[:8]}.json")
+
+    @property
+    def conversation_history(self) -> List[ConversationTurn]:
+        """Conversation turns for this session, restored from disk if the session was spilled"""
+        if self._conversation_history is None:
+            self._restore_conversation()
+        return self._conversation_history
+
+    @property
+    def is_spilled(self) -> bool:
+        return self._conversation_history is None
+
+    def spill_if_idle(self, idle_seconds: float = SESSION_IDLE_SECONDS) -> bool:
+        """Drop the in-memory conversation and prompt cache of an idle session, keeping only its history file"""
+        if not self._conversation_history:
+            return False
+        if time.monotonic() - self.last_active < idle_seconds:
+            return False
+        # Only drop turns the history file already holds; retry a save that failed earlier
+        if self._saved_turns != len(self._conversation_history):
+            self.save_chat_history()
+            if self._saved_turns != len(self._conversation_history):
+                return False
+        self._conversation_history = None
+        # The serialized catalog is rebuilt from store_data on the next prompt
+        self._store_sections = None
+        return True
+
+    def _restore_conversation(self):
+        """Reload a spilled conversation from its history file"""
+        file_path = os.path.join(self.chat_histories_dir, self.chat_history_file)
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                chat_data = json.load(f)
+            restored = [ConversationTurn.from_dict(entry) for entry in chat_data.get("conversation", [])]
+        except Exception as e:
+            # Stay spilled rather than start an empty conversation that the next save would write over the file
+            print(f"Error restoring chat history: {str(e)}")
+            raise
+        self._conversation_history = restored
+        self._saved_turns = len(restored)
 
     def _load_store_data(self) -> Dict[str, Any]:
         """Load store-specific configuration and data"""
@@ -41,13 +119,45 @@ class RenkoChatAgent:
             if not os.path.exists(config_path):
                 print(f"Config path does not exist: {config_path}")
                 return {"store_info": {}, "services": []}
-                
+            
+            self._config_mtime = os.stat(config_path).st_mtime_ns
             with open(config_path, "r", encoding='utf-8') as f:
                 return json.load(f)
         except Exception as e:
             print(f"Error loading store data: {str(e)}")
             return {"store_info": {}, "services": []}
 
+    @property
+    def store_version(self) -> int:
+        """Config version, bumped by every StoreManager patch"""
+        return self.store_data.get("version", 0)
+
+    def apply_store_data(self, store_data: Dict[str, Any]):
+        """Swap in an updated store config and drop prompt sections derived from the old one"""
+        self.store_data = store_data
+        self._store_sections = None
+
+    def refresh_store_data(self) -> bool:
+        """Reload the store config if it changed on disk, e.g. patched from another process"""
+        config_path = os.path.join(self.config_dir, f"{self.store_name}_config.json")
+        try:
+            mtime = os.stat(config_path).st_mtime_ns
+        except OSError:
+            return False
+        if mtime == self._config_mtime:
+            return False
+        self.apply_store_data(self._load_store_data())
+        return True
+
+    def _get_store_sections(self) -> Tuple[str, str]:
+        """Serialized store info and services, cached until the config changes"""
+        if self._store_sections is None:
+            self._store_sections = (
+                json.dumps(self.store_data.get("store_info", {}), indent=2),
+                json.dumps(self.store_data.get("services", []), indent=2)
+            )
+        return self._store_sections
+
     def _create_prompt_template(self) -> PromptTemplate:
         """Create the base prompt template for the store"""
         template = """You are a helpful assistant for {store_name}. 
@@ -75,22 +185,19 @@ class RenkoChatAgent:
         
         return PromptTemplate.from_template(template)
 
-    async def handle_query(self, query: str) -> str:
-        """Process customer query and return response"""
-        try:
-            # Handle cart operations
-            if query.lower().startswith(("add", "remove", "view cart", "total")):
-                return self._handle_cart_operation(query)
-            
-            # Format conversation history
+    def build_prompt(self, query: str) -> str:
+        """Build the full LLM prompt for a query"""
+        # Format conversation history
+        with tracer.span("format_history", turns=len(self.conversation_history)):
             conversation_str = self._format_conversation_history()
-            
-            # Prepare prompt
-            store_info = json.dumps(self.store_data.get("store_info", {}), indent=2)
-            services = json.dumps(self.store_data.get("services", []), indent=2)
+        
+        # Prepare prompt
+        with tracer.span("load_config"):
+            store_info, services = self._get_store_sections()
             cart_status = self.shopping_cart.view_cart()
-            
-            formatted_prompt = self.prompt_template.format(
+        
+        with tracer.span("format_prompt"):
+            return self.prompt_template.format(
                 store_name=self.store_name,
                 store_info=store_info,
                 services=services,
@@ -98,27 +205,52 @@ class RenkoChatAgent:
                 conversation_history=conversation_str,
                 query=query
             )
+
+    async def handle_query(self, query: str, deadline: Optional[float] = None) -> str:
+        """Process customer query and return response, deadline is a time.monotonic() value"""
+        self.last_active = time.monotonic()
+        with tracer.trace("handle_query", store_name=self.store_name):
+            try:
+                # Pick up price changes made by other processes before answering
+                self.refresh_store_data()
+                
+                # Handle cart operations
+                if self.is_cart_operation(query):
+                    with tracer.span("cart_operation"):
+                        return self._handle_cart_operation(query)
+                
+                formatted_prompt = self.build_prompt(query)
+                
+                # Get response
+                messages = [{"role": "user", "content": formatted_prompt}]
+                with tracer.span("llm_invoke", prompt_chars=len(formatted_prompt)):
+                    # Check the deadline before creating the coroutine, so an expired request never leaves it unawaited
+                    timeout = remaining_time(deadline)
+                    try:
+                        response = await asyncio.wait_for(self.llm.ainvoke(messages), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        raise DeadlineExceeded("LLM call did not finish before the request deadline")
+                response_content = response.content
+                
+                # Add to conversation history with timestamp, only once the response has
+                # arrived so a cancelled or timed out query leaves no partial turn
+                self.conversation_history.append(ConversationTurn(query, response_content))
+                
+                # Save after each interaction
+                with tracer.span("save_chat_history"):
+                    self.save_chat_history()
+                
+                return response_content
             
-            # Get response
-            messages = [{"role": "user", "content": formatted_prompt}]
-            response = await self.llm.ainvoke(messages)
-            response_content = response.content
-            
-            # Add to conversation history with timestamp
-            self.conversation_history.append({
-                "timestamp": datetime.now().isoformat(),
-                "user": query,
-                "assistant": response_content
-            })
-            
-            # Save after each interaction
-            self.save_chat_history()
-            
-            return response_content
-        
-        except Exception as e:
-            print(f"Error processing query: {str(e)}")
-            return "I apologize, but I'm having trouble processing your request. Please try again."
+            except DeadlineExceeded:
+                raise
+            except Exception as e:
+                print(f"Error processing query: {str(e)}")
+                return FALLBACK_RESPONSE
+
+    def is_cart_operation(self, query: str) -> bool:
+        """Whether the query is handled locally by the shopping cart instead of the LLM"""
+        return query.lower().startswith(("add", "remove", "view cart", "total"))
 
     def _handle_cart_operation(self, query: str) -> str:
         """Handle shopping cart operations"""
@@ -167,16 +299,25 @@ class RenkoChatAgent:
             
         chat_data = {
             "store_name": self.store_name,
-            "store_info": self.store_data.get("store_info", {}),
-            "session_start": datetime.now().isoformat(),
-            "conversation": self.conversation_history
+            # Store details live in the store config, so only reference it here
+            "store_config": f"{self.store_name}_config.json",
+            "session_start": self.session_start,
+            "conversation": [turn.to_dict() for turn in self.conversation_history]
         }
         
         file_path = os.path.join(self.chat_histories_dir, self.chat_history_file)
         
         try:
-            with open(file_path, 'w', encoding='utf-8') as f:
-                json.dump(chat_data, f, indent=2, ensure_ascii=False)
+            # Write to a temp file and swap it in so an interrupted save never leaves a truncated history
+            fd, tmp_path = tempfile.mkstemp(dir=self.chat_histories_dir, prefix=f"{self.chat_history_file}.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(chat_data, f, indent=2, ensure_ascii=False)
+                os.replace(tmp_path, file_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+            self._saved_turns = len(chat_data["conversation"])
             print(f"\nChat history saved to: {file_path}")
         except Exception as e:
             print(f"Error saving chat history: {str(e)}")
@@ -200,10 +341,8 @@ class RenkoChatAgent:
             return "No previous conversation."
         
         formatted_history = []
-        for entry in self.conversation_history:
-            formatted_history.append(f"User: {entry['user']}")
-            formatted_history.append(f"Assistant: {entry['assistant']}")
-            if 'store_data' in entry:
-                formatted_history.append(f"Context: {entry['store_data']}")
+        for turn in self.conversation_history:
+            formatted_history.append(f"User: {turn.user}")
+            formatted_history.append(f"Assistant: {turn.assistant}")
         
         return "\n".join(formatted_history)
\ No newline at end of file
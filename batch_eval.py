@@ -0,0 +1,191 @@
+from base_agent import RenkoChatAgent, ConversationTurn
+from responses import FALLBACK_RESPONSE
+from store_recommender import StoreRecommender
+from tools import DeadlineExceeded
+from typing import Dict, Any, List, Optional, Tuple
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import re
+import time
+
+
+class BatchEvaluator:
+    def __init__(self,
+                 input_path: str,
+                 output_path: str,
+                 concurrency: int = 4,
+                 timeout: float = 60.0,
+                 all_stores: bool = False,
+                 history_dir: Optional[str] = None):
+        """Replay logged (store, session, query) rows and stream the answers to JSONL"""
+        self.input_path = input_path
+        self.output_path = output_path
+        self.concurrency = concurrency
+        self.timeout = timeout
+        # Ask every store each question instead of the store named in the row
+        self.all_stores = all_stores
+        # Replayed sessions are kept out of chat_histories/ so they never reach chat analytics
+        self.history_dir = history_dir or os.path.join(os.getcwd(), "eval_histories")
+        self.recommender = StoreRecommender()
+        self.known_stores = set(self.recommender.store_manager.list_stores())
+        self.completed = 0
+        self.failed = 0
+
+    def _load_completed(self) -> Dict[str, Dict[str, Any]]:
+        """Read results from a previous run, the output file doubles as the checkpoint"""
+        completed: Dict[str, Dict[str, Any]] = {}
+        if not os.path.exists(self.output_path):
+            return completed
+        with open(self.output_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    result = json.loads(line)
+                except json.JSONDecodeError:
+                    continue  # Last line of an interrupted run
+                if result.get("error") is None:
+                    completed[result["key"]] = result
+        return completed
+
+    def _repair_output(self):
+        """Drop a partial last line left by an interrupted run so new results start on a fresh line"""
+        if not os.path.exists(self.output_path):
+            return
+        with open(self.output_path, 'rb+') as f:
+            f.seek(0, os.SEEK_END)
+            size = f.tell()
+            if size == 0:
+                return
+            f.seek(size - 1)
+            if f.read(1) == b"\n":
+                return
+            f.seek(0)
+            data = f.read()
+            f.truncate(data.rfind(b"\n") + 1)
+
+    def _target_stores(self, row: Dict[str, Any], all_store_names: List[str]) -> List[str]:
+        if self.all_stores or row.get("store") == "*":
+            return all_store_names
+        if row.get("store"):
+            return [row["store"]]
+        # No store given, so replay against the store a customer would have been recommended
+        scores = self.recommender.analyze_requirements(row["query"])
+        return [rec["store_name"] for rec in self.recommender.recommend_stores(scores, top_n=1)]
+
+    def _load_sessions(self) -> Dict[Tuple[str, str], List[Dict[str, Any]]]:
+        """Group input rows into per-store sessions, keeping the original turn order"""
+        all_store_names = sorted(self.known_stores)
+        sessions: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        with open(self.input_path, 'r', encoding='utf-8') as f:
+            for line_no, line in enumerate(f, 1):
+                if not line.strip():
+                    continue
+                row = json.loads(line)
+                session_id = str(row.get("session") or f"row-{line_no}")
+                for store_name in self._target_stores(row, all_store_names):
+                    sessions.setdefault((store_name, session_id), []).append({
+                        "key": f"{line_no}:{store_name}",
+                        "line": line_no,
+                        "store": store_name,
+                        "session": session_id,
+                        "query": row["query"]
+                    })
+        return sessions
+
+    def _write_result(self, output, result: Dict[str, Any]):
+        output.write(json.dumps(result, ensure_ascii=False) + "\n")
+        output.flush()
+        if result["error"] is None:
+            self.completed += 1
+        else:
+            self.failed += 1
+        if (self.completed + self.failed) % 100 == 0:
+            print(f"Processed {self.completed + self.failed} queries ({self.failed} failed)")
+
+    async def _run_session(self, store_name: str, session_id: str, jobs: List[Dict[str, Any]],
+                           completed: Dict[str, Dict[str, Any]], output, semaphore: asyncio.Semaphore):
+        """Run one session's turns in order so each query sees the earlier answers"""
+        if all(job["key"] in completed for job in jobs):
+            return
+
+        async with semaphore:
+            if store_name not in self.known_stores:
+                for job in jobs:
+                    self._write_result(output, dict(job, response=None, error=f"Store {store_name} does not exist", elapsed_ms=0.0))
+                return
+
+            agent = RenkoChatAgent(store_name, chat_histories_dir=os.path.join(self.history_dir, store_name))
+            # One history file per replayed session, the hash keeps ids like "a/b" and "a_b" apart
+            safe_session = re.sub(r"[^A-Za-z0-9_-]", "_", session_id)
+            session_hash = hashlib.sha1(session_id.encode('utf-8')).hexdigest()[:8]
+            agent.chat_history_file = f"{store_name}_chat_eval_{safe_session}_{session_hash}.json"
+
+            for job in jobs:
+                previous = completed.get(job["key"])
+                if previous is not None:
+                    # Rebuild context from the checkpoint instead of asking the LLM again
+                    if agent.is_cart_operation(job["query"]):
+                        agent._handle_cart_operation(job["query"])
+                    else:
+                        agent.conversation_history.append(ConversationTurn(job["query"], previous["response"]))
+                    continue
+
+                start = time.perf_counter()
+                error = None
+                response = None
+                try:
+                    response = await agent.handle_query(job["query"], deadline=time.monotonic() + self.timeout)
+                    if response == FALLBACK_RESPONSE:
+                        # Leave the row pending so a resumed run retries it
+                        error = "Agent returned the fallback response"
+                except DeadlineExceeded as e:
+                    error = str(e)
+                except Exception as e:
+                    error = f"{type(e).__name__}: {str(e)}"
+                result = dict(job, response=response, error=error,
+                              elapsed_ms=round((time.perf_counter() - start) * 1000, 1))
+                self._write_result(output, result)
+
+    async def run(self) -> Dict[str, int]:
+        """Evaluate every pending row with bounded concurrency"""
+        self._repair_output()
+        completed = self._load_completed()
+        sessions = self._load_sessions()
+        total = sum(len(jobs) for jobs in sessions.values())
+        print(f"Loaded {total} queries in {len(sessions)} sessions, {len(completed)} already done")
+
+        semaphore = asyncio.Semaphore(self.concurrency)
+        output_dir = os.path.dirname(os.path.abspath(self.output_path))
+        os.makedirs(output_dir, exist_ok=True)
+        with open(self.output_path, 'a', encoding='utf-8') as output:
+            await asyncio.gather(*(
+                self._run_session(store_name, session_id, jobs, completed, output, semaphore)
+                for (store_name, session_id), jobs in sessions.items()
+            ))
+
+        summary = {"total": total, "skipped": len(completed), "completed": self.completed, "failed": self.failed}
+        print(f"Batch evaluation finished: {summary}")
+        return summary
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Replay logged customer queries against store chatbots")
+    parser.add_argument("input", help="JSONL file with store, session and query fields")
+    parser.add_argument("output", help="JSONL file to stream results to, reused to resume interrupted runs")
+    parser.add_argument("--concurrency", type=int, default=4, help="Number of sessions evaluated at once")
+    parser.add_argument("--timeout", type=float, default=60.0, help="Deadline per query in seconds")
+    parser.add_argument("--all-stores", action="store_true", help="Ask every store each question")
+    parser.add_argument("--history-dir", default=None,
+                        help="Where replayed sessions are saved, defaults to eval_histories/")
+    args = parser.parse_args()
+
+    evaluator = BatchEvaluator(args.input, args.output, concurrency=args.concurrency,
+                               timeout=args.timeout, all_stores=args.all_stores,
+                               history_dir=args.history_dir)
+    await evaluator.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
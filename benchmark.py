@@ -0,0 +1,259 @@
+from contextlib import redirect_stdout
+from datetime import datetime
+from typing import Dict, Any, List, Callable, Optional
+import argparse
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+# The agent is never asked to call the LLM here, but the client needs a key to initialize
+os.environ.setdefault('OPENAI_API_KEY', 'benchmark')
+
+from base_agent import RenkoChatAgent, ConversationTurn
+from store_recommender import StoreRecommender
+from synthetic_stores import write_store_configs
+from tools import ShoppingCart
+
+SIZE_PRESETS = {
+    "quick": {
+        "stores": [10, 100],
+        "services": [10, 100],
+        "turns": [10, 100, 1000],
+        "cart_items": [10, 100],
+        "max_total_services": 10_000
+    },
+    "default": {
+        "stores": [10, 1000, 10000],
+        "services": [10, 100, 1000],
+        "turns": [10, 1000, 10000],
+        "cart_items": [10, 100, 1000],
+        "max_total_services": 1_000_000
+    },
+    "full": {
+        "stores": [10, 1000, 10000, 100000],
+        "services": [10, 100, 1000, 10000],
+        "turns": [10, 100, 1000, 10000],
+        "cart_items": [10, 100, 1000],
+        "max_total_services": 2_000_000
+    }
+}
+
+SAMPLE_QUERY = "I need running shoes and a haircut"
+# Session files written for the load_chat_histories benchmark
+HISTORY_FILES = 100
+HISTORY_FILE_TURNS = 20
+
+
+class BenchmarkSuite:
+    def __init__(self, sizes: Dict[str, Any], repeat: int = 5, min_time: float = 0.2, only: Optional[List[str]] = None):
+        """Scaling benchmarks for the recommender, cart, prompt building and chat history"""
+        self.sizes = sizes
+        self.repeat = repeat
+        self.min_time = min_time
+        self.only = only
+        self.results: List[Dict[str, Any]] = []
+
+    def _run(self, func: Callable, number: int) -> float:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        return time.perf_counter() - start
+
+    def _measure(self, name: str, params: Dict[str, Any], func: Callable):
+        """Time func, calibrating calls per sample so fast operations stay measurable"""
+        number = 1
+        elapsed = self._run(func, number)
+        while elapsed < self.min_time / self.repeat and number < 1_000_000:
+            number *= 10
+            elapsed = self._run(func, number)
+
+        samples = [elapsed / number]
+        for _ in range(self.repeat - 1):
+            samples.append(self._run(func, number) / number)
+
+        key = f"{name}[{','.join(f'{k}={v}' for k, v in params.items())}]"
+        result = {
+            "key": key,
+            "name": name,
+            "params": params,
+            "number": number,
+            "repeat": len(samples),
+            "min_s": min(samples),
+            "median_s": statistics.median(samples),
+            "mean_s": statistics.mean(samples)
+        }
+        self.results.append(result)
+        print(f"{key}: median {result['median_s'] * 1000:.3f} ms ({number} x {len(samples)})")
+
+    def _enabled(self, name: str) -> bool:
+        return not self.only or name in self.only
+
+    def _make_agent(self, store_name: str) -> RenkoChatAgent:
+        with redirect_stdout(io.StringIO()):
+            return RenkoChatAgent(store_name)
+
+    def bench_analyze_requirements(self, config_dir: str):
+        for num_stores in self.sizes["stores"]:
+            for num_services in self.sizes["services"]:
+                if num_stores * num_services > self.sizes["max_total_services"]:
+                    continue
+                shutil.rmtree(config_dir, ignore_errors=True)
+                write_store_configs(config_dir, num_stores, num_services)
+                recommender = StoreRecommender()
+                self._measure("analyze_requirements", {"stores": num_stores, "services": num_services},
+                              lambda: recommender.analyze_requirements(SAMPLE_QUERY))
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+    def bench_shopping_cart(self):
+        for num_items in self.sizes["cart_items"]:
+            def fill_cart():
+                cart = ShoppingCart()
+                for i in range(num_items):
+                    cart.add_item(f"Service {i}", 10.0 + i)
+                return cart
+
+            cart = fill_cart()
+            last_item = f"Service {num_items - 1}"
+
+            def remove_and_readd():
+                cart.remove_item(last_item)
+                cart.add_item(last_item, 10.0)
+
+            self._measure("cart_fill", {"items": num_items}, fill_cart)
+            self._measure("cart_remove_add", {"items": num_items}, remove_and_readd)
+            self._measure("cart_view", {"items": num_items}, cart.view_cart)
+            self._measure("cart_total", {"items": num_items}, cart.get_total)
+
+    def bench_prompt_construction(self, config_dir: str):
+        for num_services in self.sizes["services"]:
+            store_names = write_store_configs(config_dir, 1, num_services)
+            agent = self._make_agent(store_names[0])
+            agent.conversation_history.extend(
+                ConversationTurn(f"Question {i}", f"Answer {i}") for i in range(10))
+            self._measure("build_prompt", {"services": num_services}, lambda: agent.build_prompt(SAMPLE_QUERY))
+            shutil.rmtree(config_dir, ignore_errors=True)
+
+    def bench_conversation_history(self, config_dir: str):
+        store_names = write_store_configs(config_dir, 1, 10)
+        for num_turns in self.sizes["turns"]:
+            agent = self._make_agent(store_names[0])
+            agent.conversation_history.extend(
+                ConversationTurn(f"What is the price of item {i}?", f"Item {i} costs ${i}.99 today. " * 4)
+                for i in range(num_turns))
+            params = {"turns": num_turns}
+            self._measure("format_conversation_history", params, agent._format_conversation_history)
+
+            def save():
+                with redirect_stdout(io.StringIO()):
+                    agent.save_chat_history()
+
+            self._measure("save_chat_history", params, save)
+            self._measure("restore_conversation", params, agent._restore_conversation)
+
+        # Write a fixed set of sessions so the benchmark key and workload match across runs
+        agent = self._make_agent(store_names[0])
+        shutil.rmtree(agent.chat_histories_dir)
+        os.makedirs(agent.chat_histories_dir)
+        conversation = [ConversationTurn(f"Question {i}", f"Answer {i}").to_dict() for i in range(HISTORY_FILE_TURNS)]
+        for i in range(HISTORY_FILES):
+            with open(os.path.join(agent.chat_histories_dir, f"session_{i:04d}.json"), 'w', encoding='utf-8') as f:
+                json.dump({"store_name": agent.store_name, "conversation": conversation}, f, indent=2)
+        self._measure("load_chat_histories", {"files": HISTORY_FILES, "turns": HISTORY_FILE_TURNS},
+                      agent.load_chat_histories)
+        shutil.rmtree(config_dir, ignore_errors=True)
+
+    def run(self) -> Dict[str, Any]:
+        """Run the selected benchmarks in a scratch working directory"""
+        original_cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as workspace:
+            os.chdir(workspace)
+            try:
+                config_dir = os.path.join(workspace, "config", "store_configs")
+                if self._enabled("recommender"):
+                    self.bench_analyze_requirements(config_dir)
+                if self._enabled("cart"):
+                    self.bench_shopping_cart()
+                if self._enabled("prompt"):
+                    self.bench_prompt_construction(config_dir)
+                if self._enabled("history"):
+                    self.bench_conversation_history(config_dir)
+            finally:
+                os.chdir(original_cwd)
+
+        return {"metadata": self._metadata(), "results": self.results}
+
+    def _metadata(self) -> Dict[str, Any]:
+        try:
+            commit = subprocess.run(["git", "rev-parse", "HEAD"], capture_output=True, text=True,
+                                    cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+        except Exception:
+            commit = ""
+        return {
+            "commit": commit,
+            "timestamp": datetime.now().isoformat(),
+            "python": sys.version.split()[0],
+            "platform": platform.platform(),
+            "sizes": self.sizes
+        }
+
+
+def compare_results(current: Dict[str, Any], baseline: Dict[str, Any], threshold: float) -> List[str]:
+    """Print best-time ratios against a baseline run and return the regressed benchmark keys"""
+    baseline_by_key = {result["key"]: result for result in baseline.get("results", [])}
+    current_keys = {result["key"] for result in current["results"]}
+    regressions = []
+    print(f"\n=== Comparison with {baseline.get('metadata', {}).get('commit', 'baseline')[:12]} ===\n")
+    for result in current["results"]:
+        previous = baseline_by_key.get(result["key"])
+        if previous is None:
+            print(f"{result['key']}: missing from baseline")
+            continue
+        if not previous["min_s"]:
+            continue
+        # The fastest sample is the least affected by background noise
+        ratio = result["min_s"] / previous["min_s"]
+        marker = ""
+        if ratio > 1 + threshold:
+            regressions.append(result["key"])
+            marker = "  REGRESSION"
+        print(f"{result['key']}: {ratio:.2f}x{marker}")
+    for key in baseline_by_key:
+        if key not in current_keys:
+            print(f"{key}: missing from current run")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run SmartStore microbenchmarks")
+    parser.add_argument("--sizes", choices=sorted(SIZE_PRESETS), default="quick", help="Size preset")
+    parser.add_argument("--only", nargs="*", choices=["recommender", "cart", "prompt", "history"],
+                        help="Run only these benchmark groups")
+    parser.add_argument("--repeat", type=int, default=5, help="Samples per benchmark")
+    parser.add_argument("--output", default="bench_results.json", help="Where to write JSON results")
+    parser.add_argument("--compare", help="Baseline results JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2,
+                        help="Slowdown ratio above which a benchmark counts as a regression")
+    args = parser.parse_args()
+
+    suite = BenchmarkSuite(SIZE_PRESETS[args.sizes], repeat=args.repeat, only=args.only)
+    results = suite.run()
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to: {args.output}")
+
+    if args.compare:
+        with open(args.compare, 'r', encoding='utf-8') as f:
+            baseline = json.load(f)
+        if compare_results(results, baseline, args.threshold):
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
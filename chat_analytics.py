@@ -0,0 +1,365 @@
+from responses import FALLBACK_RESPONSE
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+from typing import Dict, Any, List, Iterator, Optional, Set, Tuple
+import argparse
+import json
+import os
+import time
+
+APOLOGY_MARKERS = ("i apologize", "i'm sorry", "i am sorry", "sorry,")
+CART_MARKERS = ("add_to_cart:", "added ")
+
+
+def _normalize_query(query: str) -> str:
+    return " ".join(query.lower().split())
+
+
+def session_contribution(conversation: List[Dict[str, Any]], mtime: float, offset: int = 0) -> Dict[str, Any]:
+    """Counts for the turns of a session from offset on, the turns before it were processed by an earlier run"""
+    if len(conversation) < offset:
+        # The file was rewritten rather than appended to, so count it from the start
+        offset = 0
+    queries: Counter = Counter()
+    fallback_turns = 0
+    apology_turns = 0
+    converted = False
+    for entry in conversation[offset:]:
+        query = entry.get("user", "")
+        response = entry.get("assistant", "")
+        response_lower = response.lower()
+
+        queries[_normalize_query(query)] += 1
+        if response.startswith(FALLBACK_RESPONSE):
+            fallback_turns += 1
+        if any(marker in response_lower for marker in APOLOGY_MARKERS):
+            apology_turns += 1
+        if query.lower().startswith("add") or any(marker in response_lower for marker in CART_MARKERS):
+            converted = True
+
+    return {
+        "mtime": mtime,
+        "offset": offset,
+        "turns": len(conversation),
+        "fallback_turns": fallback_turns,
+        "apology_turns": apology_turns,
+        "converted": converted,
+        "queries": dict(queries)
+    }
+
+
+class StoreAggregate:
+    def __init__(self, top_queries_capacity: int = 1000):
+        """Per-store conversation statistics with a bounded query counter"""
+        self.top_queries_capacity = top_queries_capacity
+        self.sessions = 0
+        self.turns = 0
+        self.fallback_turns = 0
+        self.apology_turns = 0
+        self.converted_sessions = 0
+        self.turn_histogram: Counter = Counter()
+        self.query_counts: Counter = Counter()
+
+    def apply_session(self, record: Dict[str, Any], sign: int = 1):
+        """Add a session's per-file counts, or remove them again with sign=-1"""
+        self.sessions += sign
+        self.turns += sign * record["turns"]
+        self.fallback_turns += sign * record["fallback_turns"]
+        self.apology_turns += sign * record["apology_turns"]
+        if record["converted"]:
+            self.converted_sessions += sign
+        self.turn_histogram[record["turns"]] += sign
+        if self.turn_histogram[record["turns"]] <= 0:
+            del self.turn_histogram[record["turns"]]
+
+    def add_queries(self, queries: Dict[str, int]):
+        self.query_counts.update(queries)
+        self._trim_queries()
+
+    def _trim_queries(self):
+        # Keep memory bounded; counts for rare queries become approximate
+        if len(self.query_counts) > self.top_queries_capacity * 2:
+            self.query_counts = Counter(dict(self.query_counts.most_common(self.top_queries_capacity)))
+
+    def summary(self, top_n: int = 10) -> Dict[str, Any]:
+        """Return the derived rates and top queries for reporting"""
+        return {
+            "sessions": self.sessions,
+            "turns": self.turns,
+            "avg_turns_per_session": round(self.turns / self.sessions, 2) if self.sessions else 0.0,
+            "turns_per_session": {str(k): v for k, v in sorted(self.turn_histogram.items())},
+            "fallback_rate": round(self.fallback_turns / self.turns, 4) if self.turns else 0.0,
+            "apology_rate": round(self.apology_turns / self.turns, 4) if self.turns else 0.0,
+            "cart_conversion_rate": round(self.converted_sessions / self.sessions, 4) if self.sessions else 0.0,
+            "top_queries": [{"query": q, "count": c} for q, c in self.query_counts.most_common(top_n)]
+        }
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "sessions": self.sessions,
+            "turns": self.turns,
+            "fallback_turns": self.fallback_turns,
+            "apology_turns": self.apology_turns,
+            "converted_sessions": self.converted_sessions,
+            "turn_histogram": {str(k): v for k, v in self.turn_histogram.items()},
+            "query_counts": dict(self.query_counts.most_common(self.top_queries_capacity))
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any], top_queries_capacity: int = 1000) -> "StoreAggregate":
+        aggregate = cls(top_queries_capacity)
+        aggregate.sessions = data.get("sessions", 0)
+        aggregate.turns = data.get("turns", 0)
+        aggregate.fallback_turns = data.get("fallback_turns", 0)
+        aggregate.apology_turns = data.get("apology_turns", 0)
+        aggregate.converted_sessions = data.get("converted_sessions", 0)
+        aggregate.turn_histogram = Counter({int(k): v for k, v in data.get("turn_histogram", {}).items()})
+        aggregate.query_counts = Counter(data.get("query_counts", {}))
+        return aggregate
+
+
+def _process_batch(batch: List[Tuple[str, str, str, float, int]]) -> Tuple[List[Tuple[str, str, Dict[str, Any]]], List[str]]:
+    """Worker entry point: compute contributions for a batch of (store, file name, path, mtime, offset) history files"""
+    contributions = []
+    errors = []
+    for store_name, file_name, file_path, mtime, offset in batch:
+        try:
+            with open(file_path, 'r', encoding='utf-8') as f:
+                chat_data = json.load(f)
+            contributions.append((store_name, file_name,
+                                  session_contribution(chat_data.get("conversation", []), mtime, offset)))
+        except Exception as e:
+            errors.append(f"{file_path}: {str(e)}")
+    return contributions, errors
+
+
+class ChatAnalytics:
+    def __init__(self,
+                 base_path: Optional[str] = None,
+                 output_dir: Optional[str] = None,
+                 max_workers: Optional[int] = None,
+                 batch_size: int = 200,
+                 settle_seconds: float = 3600,
+                 checkpoint_every: int = 20,
+                 top_queries_capacity: int = 1000):
+        """Incremental analytics over all stored chat histories"""
+        self.base_path = base_path or os.getcwd()
+        self.chat_histories_root = os.path.join(self.base_path, "chat_histories")
+        self.output_dir = output_dir or os.path.join(self.base_path, "analytics")
+        self.stores_dir = os.path.join(self.output_dir, "stores")
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        # Sessions still being written to are left for a later run
+        self.settle_seconds = settle_seconds
+        # Number of finished batches between state writes
+        self.checkpoint_every = checkpoint_every
+        self.top_queries_capacity = top_queries_capacity
+        self.aggregates: Dict[str, StoreAggregate] = {}
+        # store_name -> file name -> mtime and counts of the processed file, never its queries
+        self.files: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # File records changed since the last checkpoint, appended to the store's journal
+        self._pending: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self._journals: Dict[str, Dict[str, Any]] = {}
+
+    def _journal_path(self, store_name: str, generation: int) -> str:
+        return os.path.join(self.stores_dir, f"{store_name}.files.{generation}.jsonl")
+
+    def _load_state(self):
+        """Load each store's aggregate and replay its journal of processed files"""
+        self.aggregates = {}
+        self.files = {}
+        self._pending = {}
+        self._journals = {}
+        if not os.path.exists(self.stores_dir):
+            return
+        for filename in os.listdir(self.stores_dir):
+            if not filename.endswith('.json'):
+                continue
+            with open(os.path.join(self.stores_dir, filename), 'r', encoding='utf-8') as f:
+                state = json.load(f)
+            store_name = filename[:-5]
+            self.aggregates[store_name] = StoreAggregate.from_dict(state["aggregate"], self.top_queries_capacity)
+            journal = state["journal"]
+            files = {}
+            lines = 0
+            journal_path = self._journal_path(store_name, journal["generation"])
+            if os.path.exists(journal_path):
+                with open(journal_path, 'r+', encoding='utf-8') as f:
+                    # Records appended after the last state write are not in the aggregate yet
+                    f.truncate(journal["size"])
+                    for line in f:
+                        file_name, record = json.loads(line)
+                        files[file_name] = record
+                        lines += 1
+            self.files[store_name] = files
+            self._journals[store_name] = dict(journal, lines=lines)
+
+    def _iter_pending_files(self) -> Iterator[Tuple[str, str, str, float, int]]:
+        """Stream settled history files that are new or changed since they were processed"""
+        if not os.path.exists(self.chat_histories_root):
+            return
+        cutoff = time.time() - self.settle_seconds
+        with os.scandir(self.chat_histories_root) as store_dirs:
+            for store_dir in store_dirs:
+                if not store_dir.is_dir():
+                    continue
+                done = self.files.get(store_dir.name, {})
+                with os.scandir(store_dir.path) as entries:
+                    for entry in entries:
+                        if not entry.name.endswith('.json'):
+                            continue
+                        mtime = entry.stat().st_mtime
+                        if mtime > cutoff:
+                            continue
+                        previous = done.get(entry.name)
+                        if previous is not None and previous["mtime"] == mtime:
+                            continue
+                        # Sessions only grow, so a changed file is read from its first new turn
+                        offset = previous["turns"] if previous is not None else 0
+                        yield store_dir.name, entry.name, entry.path, mtime, offset
+
+    def _iter_batches(self, files: Iterator[Tuple[str, str, str, float, int]]) -> Iterator[List[Tuple[str, str, str, float, int]]]:
+        batch = []
+        for item in files:
+            batch.append(item)
+            if len(batch) >= self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _merge(self, store_name: str, file_name: str, contribution: Dict[str, Any]):
+        """Replace a file's previous counts with its updated ones and add the queries of its new turns"""
+        aggregate = self.aggregates.setdefault(store_name, StoreAggregate(self.top_queries_capacity))
+        files = self.files.setdefault(store_name, {})
+        previous = files.get(file_name)
+        record = {
+            "mtime": contribution["mtime"],
+            "turns": contribution["turns"],
+            "fallback_turns": contribution["fallback_turns"],
+            "apology_turns": contribution["apology_turns"],
+            "converted": contribution["converted"]
+        }
+        if previous is not None:
+            aggregate.apply_session(previous, sign=-1)
+            if contribution["offset"]:
+                record["fallback_turns"] += previous["fallback_turns"]
+                record["apology_turns"] += previous["apology_turns"]
+                record["converted"] = record["converted"] or previous["converted"]
+            # A rewritten file is recounted in full, its old queries stay in the approximate query counts
+        aggregate.apply_session(record)
+        aggregate.add_queries(contribution["queries"])
+        files[file_name] = record
+        self._pending.setdefault(store_name, {})[file_name] = record
+
+    def _write_store_state(self, store_name: str, journal: Dict[str, Any]):
+        state_path = os.path.join(self.stores_dir, f"{store_name}.json")
+        tmp_path = state_path + ".tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({"aggregate": self.aggregates[store_name].to_dict(),
+                       "journal": {"generation": journal["generation"], "size": journal["size"]}},
+                      f, ensure_ascii=False)
+        os.replace(tmp_path, state_path)
+
+    def _checkpoint(self):
+        """Append changed file records to each store's journal, then swap in the aggregate that covers them"""
+        os.makedirs(self.stores_dir, exist_ok=True)
+        for store_name, records in self._pending.items():
+            journal = self._journals.setdefault(store_name, {"generation": 0, "size": 0, "lines": 0})
+            files = self.files[store_name]
+            if journal["lines"] + len(records) > max(2 * len(files), 1000):
+                # Most lines are superseded, so start a new journal with one line per file
+                self._compact(store_name, journal, files)
+                continue
+            with open(self._journal_path(store_name, journal["generation"]), 'a', encoding='utf-8') as f:
+                for file_name, record in records.items():
+                    f.write(json.dumps([file_name, record], ensure_ascii=False) + "\n")
+                f.flush()
+                os.fsync(f.fileno())
+                journal["size"] = f.tell()
+            journal["lines"] += len(records)
+            # The aggregate is only replaced once the journal holds every file it counts
+            self._write_store_state(store_name, journal)
+        self._pending.clear()
+
+    def _compact(self, store_name: str, journal: Dict[str, Any], files: Dict[str, Dict[str, Any]]):
+        old_path = self._journal_path(store_name, journal["generation"])
+        journal["generation"] += 1
+        with open(self._journal_path(store_name, journal["generation"]), 'w', encoding='utf-8') as f:
+            for file_name, record in files.items():
+                f.write(json.dumps([file_name, record], ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+            journal["size"] = f.tell()
+        journal["lines"] = len(files)
+        self._write_store_state(store_name, journal)
+        if os.path.exists(old_path):
+            os.remove(old_path)
+
+    def run(self, rebuild: bool = False) -> Dict[str, StoreAggregate]:
+        """Process all pending history files with a process pool and merge the results"""
+        if rebuild and os.path.exists(self.stores_dir):
+            for filename in os.listdir(self.stores_dir):
+                os.remove(os.path.join(self.stores_dir, filename))
+        os.makedirs(self.output_dir, exist_ok=True)
+        self._load_state()
+
+        batches = self._iter_batches(self._iter_pending_files())
+        max_in_flight = self.max_workers * 2
+        total_files = 0
+        batches_since_checkpoint = 0
+        with ProcessPoolExecutor(max_workers=self.max_workers) as executor:
+            in_flight = set()
+            exhausted = False
+            while in_flight or not exhausted:
+                # Keep a bounded number of batches queued so memory stays flat
+                while not exhausted and len(in_flight) < max_in_flight:
+                    batch = next(batches, None)
+                    if batch is None:
+                        exhausted = True
+                        break
+                    in_flight.add(executor.submit(_process_batch, batch))
+                if not in_flight:
+                    break
+
+                done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    contributions, errors = future.result()
+                    for store_name, file_name, contribution in contributions:
+                        self._merge(store_name, file_name, contribution)
+                    for error in errors:
+                        print(f"Error processing chat history {error}")
+                    total_files += len(contributions)
+                    batches_since_checkpoint += 1
+                    if batches_since_checkpoint >= self.checkpoint_every:
+                        self._checkpoint()
+                        batches_since_checkpoint = 0
+
+        self._checkpoint()
+        print(f"Processed {total_files} new or changed chat history files")
+        return self.aggregates
+
+    def report(self, top_n: int = 10) -> Dict[str, Any]:
+        """Summaries for every store seen so far"""
+        return {name: agg.summary(top_n) for name, agg in sorted(self.aggregates.items())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Aggregate statistics over stored chat histories")
+    parser.add_argument("--workers", type=int, default=None, help="Number of worker processes")
+    parser.add_argument("--batch-size", type=int, default=200, help="History files per worker task")
+    parser.add_argument("--settle-seconds", type=float, default=3600,
+                        help="Skip sessions modified more recently than this")
+    parser.add_argument("--checkpoint-every", type=int, default=20, help="Batches between state writes")
+    parser.add_argument("--top", type=int, default=10, help="Number of top queries to report")
+    parser.add_argument("--rebuild", action="store_true", help="Discard saved state and reprocess everything")
+    args = parser.parse_args()
+
+    analytics = ChatAnalytics(max_workers=args.workers, batch_size=args.batch_size,
+                              settle_seconds=args.settle_seconds, checkpoint_every=args.checkpoint_every)
+    analytics.run(rebuild=args.rebuild)
+    print(json.dumps(analytics.report(args.top), indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,5 @@
 from store_manager import StoreManager
 import os
-import json
 
 def create_diverse_stores():
     # Initialize store manager
@@ -109,12 +108,7 @@ def create_diverse_stores():
     try:
         # Create config files for each store
         for store_name, config in stores_config.items():
-            config_path = os.path.join(config_dir, f"{store_name}_config.json")
-            with open(config_path, 'w', encoding='utf-8') as f:
-                json.dump(config, f, indent=2, ensure_ascii=False)
-            print(f"Created configuration file for {store_name}")
-            
-            # Create store using store manager
+            # Create store using store manager, which writes the config and bumps its version
             store_manager.create_store(
                 store_name,
                 config["store_info"],
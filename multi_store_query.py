@@ -0,0 +1,128 @@
+from store_manager import StoreManager
+from tools import DeadlineExceeded
+from typing import Dict, Any, List, AsyncIterator, Optional, Tuple
+import asyncio
+import re
+import time
+
+PRICE_KEYWORDS = ("cheapest", "cheap", "price", "prices", "cost", "costs", "how much", "expensive", "affordable")
+STOP_WORDS = {
+    "the", "and", "for", "who", "has", "have", "what", "which", "where", "does", "your", "you",
+    "any", "some", "with", "are", "how", "much", "need", "want", "looking", "cheapest", "cheap",
+    "price", "prices", "cost", "costs", "expensive", "affordable", "store", "stores", "sell",
+    "can", "get", "buy", "got", "one", "from", "that", "this", "there", "near", "offer", "offers",
+    "lowest", "best", "anyone", "tell", "about"
+}
+
+
+class MultiStoreQuery:
+    def __init__(self, store_manager: Optional[StoreManager] = None, timeout: float = 20.0):
+        """Send one question to several stores at once"""
+        self.store_manager = store_manager or StoreManager()
+        self.timeout = timeout
+
+    def _keywords(self, query: str) -> List[Tuple[str, ...]]:
+        """Content words of the query, each with the spellings that count as a match"""
+        words = re.findall(r"[a-z0-9]+", query.lower())
+        keywords = []
+        for word in words:
+            if len(word) <= 2 or word in STOP_WORDS:
+                continue
+            # Let "shoes" match "Running Shoes" as well as "shoe"
+            if word.endswith("s") and len(word) > 3:
+                keywords.append((word, word[:-1]))
+            else:
+                keywords.append((word,))
+        return keywords
+
+    def _match_services(self, keywords: List[Tuple[str, ...]], services: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], int]:
+        """Services matching every keyword, keeping those with the most keywords in their name"""
+        matches = []
+        best_score = 0
+        if not keywords:
+            return matches, best_score
+        for service in services:
+            service_name = service.get("name", "").lower()
+            service_desc = service.get("description", "").lower()
+            score = 0
+            for spellings in keywords:
+                if any(spelling in service_name for spelling in spellings):
+                    score += 1
+                elif not any(spelling in service_desc for spelling in spellings):
+                    break
+            else:
+                if score > best_score or not matches:
+                    matches = [service]
+                    best_score = score
+                elif score == best_score:
+                    matches.append(service)
+        return matches, best_score
+
+    def answer_from_catalog(self, query: str, store_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Answer price questions straight from the store config, without calling the LLM"""
+        query_lower = query.lower()
+        if not any(keyword in query_lower for keyword in PRICE_KEYWORDS):
+            return None
+
+        services = [service for service in store_data.get("services", []) if "price" in service]
+        matches, score = self._match_services(self._keywords(query), services)
+        if not matches:
+            return None
+
+        matches.sort(key=lambda service: service["price"])
+        store_label = store_data.get("store_info", {}).get("name", "This store")
+        lines = [f"- {service['name']}: ${service['price']:.2f}" for service in matches]
+        return {
+            "response": f"{store_label} offers:\n" + "\n".join(lines),
+            "matches": [{"name": service["name"], "price": service["price"]} for service in matches],
+            # Keywords found in the service name, a closer match than one found only in the description
+            "match_score": score
+        }
+
+    async def _ask_store(self, store_name: str, query: str) -> Dict[str, Any]:
+        """Answer from the local catalog when possible, otherwise ask the store's agent"""
+        start = time.perf_counter()
+        result: Dict[str, Any] = {"store_name": store_name}
+        try:
+            agent = self.store_manager.get_store_chatbot(store_name)
+            agent.refresh_store_data()
+            catalog_answer = self.answer_from_catalog(query, agent.store_data)
+            if catalog_answer is not None:
+                result.update(catalog_answer, source="catalog")
+            else:
+                deadline = time.monotonic() + self.timeout
+                response = await agent.handle_query(query, deadline=deadline)
+                result.update(source="agent", response=response, matches=[])
+        except DeadlineExceeded:
+            result.update(source="timeout", response=f"No response within {self.timeout:g} seconds", matches=[])
+        except Exception as e:
+            result.update(source="error", response=str(e), matches=[])
+        result["elapsed_ms"] = round((time.perf_counter() - start) * 1000, 1)
+        return result
+
+    async def ask(self, query: str, store_names: List[str]) -> AsyncIterator[Dict[str, Any]]:
+        """Ask all stores concurrently and yield each store's result as soon as it completes"""
+        tasks = [asyncio.ensure_future(self._ask_store(store_name, query)) for store_name in store_names]
+        try:
+            for next_result in asyncio.as_completed(tasks):
+                yield await next_result
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    async def ask_all(self, query: str, store_names: List[str]) -> Dict[str, Any]:
+        """Collect every store's result and pick the cheapest catalog match"""
+        results = [result async for result in self.ask(query, store_names)]
+        return {"results": results, "cheapest": self.cheapest(results)}
+
+    def cheapest(self, results: List[Dict[str, Any]]) -> Optional[Dict[str, Any]]:
+        """Lowest priced catalog match across all store results, among the stores with the closest matches"""
+        best = None
+        best_key = None
+        for result in results:
+            for match in result.get("matches", []):
+                key = (-result.get("match_score", 0), match["price"])
+                if best_key is None or key < best_key:
+                    best = {"store_name": result["store_name"], **match}
+                    best_key = key
+        return best
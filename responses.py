@@ -0,0 +1,2 @@
+# Response text shared by the agent and the offline jobs, kept free of heavy imports
+FALLBACK_RESPONSE = "I apologize, but I'm having trouble processing your request. Please try again."
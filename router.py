@@ -1,9 +1,13 @@
-from fastapi import FastAPI, HTTPException
-from .base_agent import RenkoChatAgent
+from fastapi import FastAPI, HTTPException, Request
+# Take tracer and DeadlineExceeded from base_agent so the router sees the same
+# module objects the agent uses, not a second copy loaded under the package name
+from .base_agent import RenkoChatAgent, DeadlineExceeded, tracer
 from ..monitoring.metrics import ChatbotMetrics
 from ..cache.redis_cache import RedisCache
-from typing import Dict
+from typing import Dict, Optional, Awaitable, Any
+import asyncio
 import os
+import time
 
 app = FastAPI()
 metrics = ChatbotMetrics()
@@ -12,25 +16,60 @@ cache = RedisCache(
     port=int(os.getenv('REDIS_PORT', 6379))
 )
 
+REQUEST_TIMEOUT_SECONDS = float(os.getenv('RENKO_REQUEST_TIMEOUT_SECONDS', 30))
+DISCONNECT_POLL_SECONDS = 0.5
+
+class ClientDisconnected(Exception):
+    """Raised when the client goes away before the response is ready"""
+
+async def _cancel_on_disconnect(request: Request, work: Awaitable[Any]) -> Any:
+    """Run work, cancelling it as soon as the client disconnects"""
+    task = asyncio.ensure_future(work)
+    try:
+        while True:
+            done, _ = await asyncio.wait({task}, timeout=DISCONNECT_POLL_SECONDS)
+            if done:
+                return task.result()
+            if await request.is_disconnected():
+                raise ClientDisconnected()
+    finally:
+        if not task.done():
+            task.cancel()
+
 @app.post("/chat")
-async def handle_chat(store_name: str, query: str):
+async def handle_chat(request: Request, store_name: str, query: str, timeout: Optional[float] = None):
+    deadline = time.monotonic() + (timeout or REQUEST_TIMEOUT_SECONDS)
     async with metrics.track_response_time(store_name):
-        try:
-            # Check cache first
-            cached_response = await cache.get_cached_response(store_name, query)
-            if cached_response:
-                await metrics.track_request(store_name, "cache_hit")
-                return {"response": cached_response}
+        with tracer.trace("chat", store_name=store_name):
+            try:
+                agent = get_store_agent(store_name)
+                agent.refresh_store_data()
+                # Key cached responses by config version so a store update only invalidates that store
+                cache_key = f"{store_name}:v{agent.store_version}"
+                
+                # Check cache first
+                with tracer.span("cache_lookup"):
+                    cached_response = await cache.get_cached_response(cache_key, query)
+                if cached_response:
+                    await metrics.track_request(store_name, "cache_hit")
+                    return {"response": cached_response}
 
-            # Get response from chatbot
-            response = await get_store_agent(store_name).handle_query(query)
-            
-            # Cache the response
-            await cache.cache_response(store_name, query, response)
-            
-            await metrics.track_request(store_name, "success")
-            return {"response": response}
-            
-        except Exception as e:
-            await metrics.track_request(store_name, "error")
-            raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+                # Get response from chatbot
+                response = await _cancel_on_disconnect(request, agent.handle_query(query, deadline=deadline))
+                
+                # Cache the response
+                with tracer.span("cache_store"):
+                    await cache.cache_response(cache_key, query, response)
+                
+                await metrics.track_request(store_name, "success")
+                return {"response": response}
+                
+            except ClientDisconnected:
+                await metrics.track_request(store_name, "client_disconnected")
+                raise HTTPException(status_code=499, detail="Client closed request")
+            except DeadlineExceeded:
+                await metrics.track_request(store_name, "timeout")
+                raise HTTPException(status_code=504, detail="Request deadline exceeded")
+            except Exception as e:
+                await metrics.track_request(store_name, "error")
+                raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
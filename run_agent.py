@@ -1,10 +1,12 @@
 from store_recommender import StoreRecommender
 from store_manager import StoreManager
+from multi_store_query import MultiStoreQuery
 import asyncio
 
 async def main():
     recommender = StoreRecommender()
     store_manager = StoreManager()
+    multi_store = MultiStoreQuery(store_manager)
 
     while True:
         # Get user requirements
@@ -24,10 +26,32 @@ async def main():
         # Ask if user wants to chat with a specific store
         if recommendations:
             while True:
-                choice = input("\nWould you like to chat with any of these stores? (Enter store number or 'no'): ")
+                choice = input("\nWould you like to chat with any of these stores? (Enter store number, 'all' to ask every store, or 'no'): ")
                 
                 if choice.lower() == 'no':
                     break
+                
+                if choice.lower() == 'all':
+                    store_names = [rec["store_name"] for rec in recommendations]
+                    print("\n=== Asking all recommended stores ===")
+                    print("Type 'quit' to exit")
+                    print("-" * 50 + "\n")
+                    
+                    while True:
+                        query = input("Your question: ")
+                        if query.lower() == 'quit':
+                            break
+                        
+                        # Print each store's answer as soon as it arrives
+                        results = []
+                        async for result in multi_store.ask(query, store_names):
+                            results.append(result)
+                            print(f"[{result['store_name']}] {result['response']}\n")
+                        
+                        cheapest = multi_store.cheapest(results)
+                        if cheapest:
+                            print(f"Cheapest: {cheapest['name']} at {cheapest['store_name']} for ${cheapest['price']:.2f}\n")
+                    break
                     
                 try:
                     store_index = int(choice) - 1
@@ -45,9 +69,9 @@ async def main():
                                 break
                             elif query.lower() == 'history':
                                 print("\nConversation History:")
-                                for entry in agent.conversation_history:
-                                    print(f"User: {entry['user']}")
-                                    print(f"Assistant: {entry['assistant']}\n")
+                                for turn in agent.conversation_history:
+                                    print(f"User: {turn.user}")
+                                    print(f"Assistant: {turn.assistant}\n")
                                 continue
                                 
                             response = await agent.handle_query(query)
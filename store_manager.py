@@ -1,14 +1,36 @@
-from typing import Dict, Any, List
+from contextlib import contextmanager
+from typing import Dict, Any, List, Callable
 import json
 import os
+import tempfile
+import threading
+import time
+import weakref
 from datetime import datetime
-from base_agent import RenkoChatAgent
+from base_agent import RenkoChatAgent, SESSION_IDLE_SECONDS
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+# How often get_store_chatbot sweeps for idle sessions to spill
+IDLE_SWEEP_INTERVAL = 60
 
 class StoreManager:
+    # Every manager in the process, so config patches reach all live agents
+    _instances = weakref.WeakSet()
+    _config_locks: Dict[str, threading.Lock] = {}
+    _config_locks_guard = threading.Lock()
+
     def __init__(self):
         self.stores: Dict[str, RenkoChatAgent] = {}
+        self._update_listeners: List[Callable[[str, Dict[str, Any]], None]] = []
+        StoreManager._instances.add(self)
         self.config_dir = os.path.join(os.getcwd(), "config", "store_configs")
         os.makedirs(self.config_dir, exist_ok=True)  # Create config directory if it doesn't exist
+        self._last_idle_sweep = time.monotonic()
 
     def _load_existing_stores(self):
         """Load all existing store configurations"""
@@ -26,19 +48,17 @@ class StoreManager:
 
     def create_store(self, store_name: str, store_info: Dict[str, Any], services: List[Dict[str, Any]]) -> RenkoChatAgent:
         """Create a new store with its chatbot"""
-        # Create store configuration
-        config = {
-            "store_info": store_info,
-            "services": services,
-            "created_at": datetime.now().isoformat()
-        }
-
-        # Save store configuration
-        config_path = os.path.join(self.config_dir, f"{store_name}_config.json")
-        os.makedirs(os.path.dirname(config_path), exist_ok=True)
-        
-        with open(config_path, 'w', encoding='utf-8') as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
+        # Replace the whole configuration, keeping the version increasing if the store existed
+        def replace(config: Dict[str, Any]):
+            config.clear()
+            config.update({
+                "store_info": store_info,
+                "services": services,
+                "created_at": datetime.now().isoformat()
+            })
+
+        os.makedirs(self.config_dir, exist_ok=True)
+        self._patch_config(store_name, replace, create=True)
 
         # Create and store chatbot instance
         self.stores[store_name] = RenkoChatAgent(store_name)
@@ -48,6 +68,8 @@ class StoreManager:
 
     def get_store_chatbot(self, store_name: str) -> RenkoChatAgent:
         """Get chatbot for existing store"""
+        if time.monotonic() - self._last_idle_sweep > IDLE_SWEEP_INTERVAL:
+            self.spill_idle_sessions()
         if store_name not in self.stores:
             # Try to load the store if it exists
             config_path = os.path.join(self.config_dir, f"{store_name}_config.json")
@@ -57,6 +79,125 @@ class StoreManager:
                 raise ValueError(f"Store {store_name} does not exist")
         return self.stores[store_name]
 
+    def add_update_listener(self, listener: Callable[[str, Dict[str, Any]], None]):
+        """Register a callback invoked with (store_name, config) after a store config is patched"""
+        self._update_listeners.append(listener)
+
+    def _config_lock(self, store_name: str) -> threading.Lock:
+        with StoreManager._config_locks_guard:
+            return StoreManager._config_locks.setdefault(store_name, threading.Lock())
+
+    @contextmanager
+    def _locked_config(self, store_name: str):
+        """Hold the store's config lock across threads and processes"""
+        lock_path = os.path.join(self.config_dir, f"{store_name}_config.json.lock")
+        with self._config_lock(store_name), open(lock_path, 'a+') as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file.fileno(), fcntl.LOCK_EX)
+            else:
+                lock_file.seek(0)
+                msvcrt.locking(lock_file.fileno(), msvcrt.LK_LOCK, 1)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file.fileno(), fcntl.LOCK_UN)
+                else:
+                    lock_file.seek(0)
+                    msvcrt.locking(lock_file.fileno(), msvcrt.LK_UNLCK, 1)
+
+    def _patch_config(self, store_name: str, patch: Callable[[Dict[str, Any]], None], create: bool = False) -> Dict[str, Any]:
+        """Apply a patch to a store config atomically and bump its version"""
+        config_path = os.path.join(self.config_dir, f"{store_name}_config.json")
+        # Other processes patch configs too, so the read-modify-write holds a file lock
+        with self._locked_config(store_name):
+            if os.path.exists(config_path):
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+            elif create:
+                config = {}
+            else:
+                raise ValueError(f"Store {store_name} does not exist")
+
+            version = config.get("version", 0)
+            patch(config)
+            config["version"] = version + 1
+            config["updated_at"] = datetime.now().isoformat()
+
+            # Write to a temp file and swap it in so readers never see a partial config
+            fd, tmp_path = tempfile.mkstemp(dir=self.config_dir, prefix=f"{store_name}_config.", suffix=".tmp")
+            try:
+                with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, indent=2, ensure_ascii=False)
+                # mkstemp creates the file readable by its owner only
+                os.chmod(tmp_path, 0o644)
+                os.replace(tmp_path, config_path)
+            except BaseException:
+                os.remove(tmp_path)
+                raise
+
+        for manager in list(StoreManager._instances):
+            manager._apply_update(store_name, config)
+        return config
+
+    def _apply_update(self, store_name: str, config: Dict[str, Any]):
+        """Refresh the live agent and derived caches for one store"""
+        if store_name in self.stores:
+            self.stores[store_name].apply_store_data(config)
+        for listener in self._update_listeners:
+            try:
+                listener(store_name, config)
+            except Exception as e:
+                print(f"Error notifying store update listener: {str(e)}")
+
+    def _apply_changes(self, target: Dict[str, Any], changes: Dict[str, Any]):
+        # A value of None removes the field
+        for key, value in changes.items():
+            if value is None:
+                target.pop(key, None)
+            else:
+                target[key] = value
+
+    def update_store_info(self, store_name: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Update individual store_info fields without rewriting the rest of the config"""
+        def patch(config: Dict[str, Any]):
+            self._apply_changes(config.setdefault("store_info", {}), changes)
+        return self._patch_config(store_name, patch)
+
+    def update_service(self, store_name: str, service_name: str, changes: Dict[str, Any]) -> Dict[str, Any]:
+        """Update individual fields of one service, e.g. its price"""
+        def patch(config: Dict[str, Any]):
+            for service in config.get("services", []):
+                if service.get("name", "").lower() == service_name.lower():
+                    self._apply_changes(service, changes)
+                    return
+            raise ValueError(f"Service {service_name} not found in store {store_name}")
+        return self._patch_config(store_name, patch)
+
+    def add_service(self, store_name: str, service: Dict[str, Any]) -> Dict[str, Any]:
+        """Add a new service to a store"""
+        def patch(config: Dict[str, Any]):
+            services = config.setdefault("services", [])
+            if any(s.get("name", "").lower() == service["name"].lower() for s in services):
+                raise ValueError(f"Service {service['name']} already exists in store {store_name}")
+            services.append(service)
+        return self._patch_config(store_name, patch)
+
+    def remove_service(self, store_name: str, service_name: str) -> Dict[str, Any]:
+        """Remove a service from a store"""
+        def patch(config: Dict[str, Any]):
+            services = config.get("services", [])
+            remaining = [s for s in services if s.get("name", "").lower() != service_name.lower()]
+            if len(remaining) == len(services):
+                raise ValueError(f"Service {service_name} not found in store {store_name}")
+            config["services"] = remaining
+        return self._patch_config(store_name, patch)
+
+    def spill_idle_sessions(self, idle_seconds: float = SESSION_IDLE_SECONDS) -> int:
+        """Move idle store conversations out of memory, they are restored on the next message"""
+        self._last_idle_sweep = time.monotonic()
+        return sum(1 for agent in self.stores.values() if agent.spill_if_idle(idle_seconds))
+
     def list_stores(self) -> List[str]:
         """List all available stores"""
         # Refresh store list from config directory
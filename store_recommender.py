@@ -1,11 +1,14 @@
 from store_manager import StoreManager
 import json
 import os
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Tuple
 
 class StoreRecommender:
     def __init__(self):
         self.store_manager = StoreManager()
+        # store_name -> (config mtime, parsed config), dropped when a store is patched
+        self._config_cache: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self.store_manager.add_update_listener(self._invalidate_store)
         self.categories = {
             "sports": ["equipment", "fitness", "sports", "gym", "athletic", "training"],
             "books": ["book", "read", "study", "academic", "novel", "textbook"],
@@ -30,9 +33,7 @@ class StoreRecommender:
 
         # Load all store configurations
         for store_name in self.store_manager.list_stores():
-            config_path = os.path.join(self.store_manager.config_dir, f"{store_name}_config.json")
-            with open(config_path, 'r', encoding='utf-8') as f:
-                store_config = json.load(f)
+            store_config = self._load_store_config(store_name)
 
             score = self._calculate_store_match(user_input, store_config)
             store_scores.append({
@@ -44,6 +45,22 @@ class StoreRecommender:
         # Sort by score in descending order
         return sorted(store_scores, key=lambda x: x["score"], reverse=True)
 
+    def _invalidate_store(self, store_name: str, config: Dict[str, Any]):
+        self._config_cache.pop(store_name, None)
+
+    def _load_store_config(self, store_name: str) -> Dict[str, Any]:
+        """Read a store config, reusing the parsed copy while the file is unchanged"""
+        config_path = os.path.join(self.store_manager.config_dir, f"{store_name}_config.json")
+        mtime = os.stat(config_path).st_mtime_ns
+        cached = self._config_cache.get(store_name)
+        if cached is not None and cached[0] == mtime:
+            return cached[1]
+
+        with open(config_path, 'r', encoding='utf-8') as f:
+            store_config = json.load(f)
+        self._config_cache[store_name] = (mtime, store_config)
+        return store_config
+
     def _calculate_store_match(self, user_input: str, store_config: Dict) -> float:
         score = 0.0
         
@@ -0,0 +1,133 @@
+from datetime import datetime
+from typing import Dict, Any, List, Iterator, Tuple
+import argparse
+import json
+import os
+import random
+
+# Store templates in the same shape as create_stores.py
+STORE_TEMPLATES = {
+    "sports": {
+        "description": "Your one-stop shop for sports equipment and athletic gear",
+        "hours": "9 AM - 9 PM",
+        "extra_info": {"return_policy": "30-day return with receipt", "warranty": "1-year warranty on equipment"},
+        "items": [
+            ("Basketball", "Official size basketball"),
+            ("Tennis Racket", "Professional tennis racket"),
+            ("Running Shoes", "High-performance running shoes"),
+            ("Yoga Mat", "Non-slip fitness yoga mat"),
+            ("Gym Gloves", "Padded training gloves")
+        ],
+        "extra_field": ("brands", ["Nike", "Adidas", "Wilson", "Head", "New Balance", "Spalding"])
+    },
+    "books": {
+        "description": "Wide collection of books across all genres",
+        "hours": "10 AM - 8 PM",
+        "extra_info": {"membership": "Available with 10% discount", "online_ordering": "Available with home delivery"},
+        "items": [
+            ("Fiction Books", "Latest fiction titles"),
+            ("Academic Books", "Textbooks and reference materials"),
+            ("Book Binding", "Professional book binding service"),
+            ("Study Guides", "Exam preparation study guides"),
+            ("Novel Box Set", "Collected novel series")
+        ],
+        "extra_field": ("categories", ["Mystery", "Romance", "Sci-Fi", "Science", "Mathematics", "History"])
+    },
+    "beauty": {
+        "description": "Premium beauty and wellness services",
+        "hours": "8 AM - 7 PM",
+        "extra_info": {"appointment": "Online booking available", "cancellation_policy": "24-hour notice required"},
+        "items": [
+            ("Haircut & Styling", "Professional haircut and styling"),
+            ("Makeup Service", "Professional makeup application"),
+            ("Spa Package", "Complete spa treatment package"),
+            ("Massage", "Relaxing full body massage"),
+            ("Manicure", "Classic salon manicure")
+        ],
+        "extra_field": ("duration", ["30 minutes", "45 minutes", "60 minutes", "90 minutes", "120 minutes"])
+    },
+    "coffee": {
+        "description": "Cozy cafe with specialty coffee and a quiet place to work",
+        "hours": "7 AM - 6 PM",
+        "extra_info": {"wifi": "Free wifi for customers", "seating": "Indoor and outdoor seating"},
+        "items": [
+            ("Espresso", "Double shot espresso coffee"),
+            ("Cappuccino", "Classic cappuccino drink"),
+            ("Croissant", "Fresh butter pastry"),
+            ("Breakfast Set", "Coffee and breakfast combo"),
+            ("Cold Brew", "Slow steeped cold brew coffee")
+        ],
+        "extra_field": ("sizes", ["Small", "Medium", "Large"])
+    }
+}
+
+
+def generate_store_config(index: int, num_services: int, rng: random.Random) -> Tuple[str, Dict[str, Any]]:
+    """Generate one synthetic store name and config"""
+    category = list(STORE_TEMPLATES)[index % len(STORE_TEMPLATES)]
+    template = STORE_TEMPLATES[category]
+    store_name = f"{category}_store_{index:06d}"
+
+    store_info = {
+        "name": f"Synthetic {category.title()} Store {index}",
+        "address": f"{rng.randint(1, 9999)} Market St, City",
+        "phone": f"555-{rng.randint(0, 9999):04d}",
+        "hours": template["hours"],
+        "description": template["description"]
+    }
+    store_info.update(template["extra_info"])
+
+    field_name, field_values = template["extra_field"]
+    services = []
+    for service_index in range(num_services):
+        item_name, item_desc = template["items"][service_index % len(template["items"])]
+        # Keep the first round of names identical to the real stores so keyword matching behaves the same
+        variant = service_index // len(template["items"])
+        services.append({
+            "name": item_name if variant == 0 else f"{item_name} {variant}",
+            "price": round(rng.uniform(5, 500), 2),
+            "description": item_desc,
+            field_name: rng.sample(field_values, k=min(2, len(field_values)))
+        })
+
+    return store_name, {
+        "store_info": store_info,
+        "services": services,
+        "created_at": datetime.now().isoformat()
+    }
+
+
+def generate_stores(num_stores: int, services_per_store: int, seed: int = 0) -> Iterator[Tuple[str, Dict[str, Any]]]:
+    """Stream deterministic synthetic store configs"""
+    rng = random.Random(seed)
+    for index in range(num_stores):
+        yield generate_store_config(index, services_per_store, rng)
+
+
+def write_store_configs(config_dir: str, num_stores: int, services_per_store: int, seed: int = 0) -> List[str]:
+    """Write synthetic store configs where StoreManager expects them"""
+    os.makedirs(config_dir, exist_ok=True)
+    store_names = []
+    for store_name, config in generate_stores(num_stores, services_per_store, seed):
+        config_path = os.path.join(config_dir, f"{store_name}_config.json")
+        with open(config_path, 'w', encoding='utf-8') as f:
+            json.dump(config, f, ensure_ascii=False)
+        store_names.append(store_name)
+    return store_names
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate synthetic store configurations")
+    parser.add_argument("--stores", type=int, default=100, help="Number of stores to generate")
+    parser.add_argument("--services", type=int, default=10, help="Number of services per store")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed")
+    parser.add_argument("--config-dir", default=os.path.join(os.getcwd(), "config", "store_configs"),
+                        help="Directory to write store configs to")
+    args = parser.parse_args()
+
+    store_names = write_store_configs(args.config_dir, args.stores, args.services, args.seed)
+    print(f"Created {len(store_names)} synthetic stores in {args.config_dir}")
+
+
+if __name__ == "__main__":
+    main()
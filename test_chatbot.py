@@ -1,8 +1,16 @@
 import asyncio
 from store_manager import StoreManager
 from store_recommender import StoreRecommender
+from tracing import Tracer
+from chat_analytics import ChatAnalytics
+from multi_store_query import MultiStoreQuery
+from batch_eval import BatchEvaluator
+from tools import DeadlineExceeded
+from base_agent import ConversationTurn
 import os
 import json
+import tempfile
+import time
 
 class ChatbotTester:
     def __init__(self):
@@ -25,6 +33,27 @@ class ChatbotTester:
         # Test 4: Chat History
         await self.test_chat_history()
         
+        # Test 5: Request Tracing
+        await self.test_tracing()
+        
+        # Test 6: Chat History Analytics
+        await self.test_chat_analytics()
+        
+        # Test 7: Idle Session Spill
+        await self.test_session_spill()
+        
+        # Test 8: Cross-Store Queries
+        await self.test_multi_store_query()
+        
+        # Test 9: Partial Config Updates
+        await self.test_config_updates()
+        
+        # Test 10: Request Deadlines
+        await self.test_request_deadlines()
+        
+        # Test 11: Batch Evaluation Resume
+        await self.test_batch_eval()
+        
         self.print_test_results()
 
     async def test_store_creation(self):
@@ -121,6 +150,297 @@ class ChatbotTester:
         except Exception as e:
             self.test_results.append(("Chat History", "ERROR", str(e)))
 
+    async def test_tracing(self):
+        print("Testing Request Tracing...")
+        try:
+            with tempfile.TemporaryDirectory() as trace_dir:
+                tracer = Tracer(enabled=True, sample_rate=1.0, profile_rate=1.0, output_dir=trace_dir)
+                with tracer.trace("test_request", store_name="test"):
+                    with tracer.span("stage_one"):
+                        with tracer.span("stage_two"):
+                            sum(range(1000))
+                
+                trace_files = os.listdir(trace_dir)
+                if not trace_files:
+                    self.test_results.append(("Tracing", "FAILED", "No trace file exported"))
+                    return
+                
+                with open(os.path.join(trace_dir, trace_files[0]), 'r', encoding='utf-8') as f:
+                    trace = json.loads(f.readline())
+                spans = trace["spans"]
+                if [span["name"] for span in spans] == ["stage_one", "stage_two"] and spans[1]["parent_id"] == 0 and "profile" in trace:
+                    self.test_results.append(("Tracing", "PASSED", "Spans and profile exported"))
+                else:
+                    self.test_results.append(("Tracing", "FAILED", f"Unexpected trace: {spans}"))
+            
+            # A slow request is exported without a profile and turns profiling on for the next one
+            with tempfile.TemporaryDirectory() as trace_dir:
+                slow_tracer = Tracer(enabled=True, sample_rate=0.0, slow_threshold_ms=20,
+                                     profile_after_slow=1, output_dir=trace_dir)
+                for _ in range(2):
+                    with slow_tracer.trace("slow_request"):
+                        time.sleep(0.03)
+                with open(os.path.join(trace_dir, os.listdir(trace_dir)[0]), 'r', encoding='utf-8') as f:
+                    traces = [json.loads(line) for line in f]
+                if ["profile" in trace for trace in traces] == [False, True]:
+                    self.test_results.append(("Tracing", "PASSED", "Slow request triggers profiling of the next one"))
+                else:
+                    self.test_results.append(("Tracing", "FAILED", f"Unexpected slow traces: {len(traces)}"))
+            
+            disabled = Tracer(enabled=False)
+            if disabled.trace("noop") is disabled.span("noop"):
+                self.test_results.append(("Tracing", "PASSED", "Disabled tracer returns shared no-op context"))
+            else:
+                self.test_results.append(("Tracing", "FAILED", "Disabled tracer allocates contexts"))
+        
+        except Exception as e:
+            self.test_results.append(("Tracing", "ERROR", str(e)))
+
+    async def test_chat_analytics(self):
+        print("Testing Chat History Analytics...")
+        try:
+            with tempfile.TemporaryDirectory() as base_path:
+                history_dir = os.path.join(base_path, "chat_histories", "test_store")
+                os.makedirs(history_dir)
+                sessions = [
+                    [{"user": "What are your hours?", "assistant": "We are open 9 AM - 9 PM."},
+                     {"user": "Add basketball", "assistant": "ADD_TO_CART: Basketball"}],
+                    [{"user": "what are your  hours?", "assistant": "I apologize, but I'm having trouble processing your request. Please try again."}]
+                ]
+                for i, conversation in enumerate(sessions):
+                    with open(os.path.join(history_dir, f"session_{i}.json"), 'w', encoding='utf-8') as f:
+                        json.dump({"store_name": "test_store", "conversation": conversation}, f)
+                
+                analytics = ChatAnalytics(base_path=base_path, max_workers=2, settle_seconds=0)
+                analytics.run()
+                summary = analytics.report()["test_store"]
+                if (summary["sessions"] == 2 and summary["fallback_rate"] == round(1 / 3, 4)
+                        and summary["cart_conversion_rate"] == 0.5
+                        and summary["top_queries"][0] == {"query": "what are your hours?", "count": 2}):
+                    self.test_results.append(("Chat Analytics", "PASSED", "Aggregates computed across sessions"))
+                else:
+                    self.test_results.append(("Chat Analytics", "FAILED", f"Unexpected summary: {summary}"))
+                
+                # A second run must skip the files that were already processed
+                rerun = ChatAnalytics(base_path=base_path, max_workers=2, settle_seconds=0)
+                rerun.run()
+                if rerun.report()["test_store"]["sessions"] == 2:
+                    self.test_results.append(("Chat Analytics", "PASSED", "Processed files skipped on rerun"))
+                else:
+                    self.test_results.append(("Chat Analytics", "FAILED", "Files were processed twice"))
+                
+                # A session that continues after a run replaces its earlier contribution
+                sessions[1].append({"user": "Add basketball", "assistant": "Added Basketball to cart"})
+                session_path = os.path.join(history_dir, "session_1.json")
+                with open(session_path, 'w', encoding='utf-8') as f:
+                    json.dump({"store_name": "test_store", "conversation": sessions[1]}, f)
+                stat = os.stat(session_path)
+                os.utime(session_path, ns=(stat.st_atime_ns, stat.st_mtime_ns - 10_000_000_000))
+                
+                grown = ChatAnalytics(base_path=base_path, max_workers=2, settle_seconds=0)
+                grown.run()
+                summary = grown.report()["test_store"]
+                if summary["sessions"] == 2 and summary["turns"] == 4 and summary["cart_conversion_rate"] == 1.0:
+                    self.test_results.append(("Chat Analytics", "PASSED", "Changed session reprocessed without double counting"))
+                else:
+                    self.test_results.append(("Chat Analytics", "FAILED", f"Changed session miscounted: {summary}"))
+        
+        except Exception as e:
+            self.test_results.append(("Chat Analytics", "ERROR", str(e)))
+
+    async def test_session_spill(self):
+        print("Testing Idle Session Spill...")
+        try:
+            stores = self.store_manager.list_stores()
+            for store_name in stores[:1]:  # Test with first store
+                agent = self.store_manager.get_store_chatbot(store_name)
+                
+                await agent.handle_query("Test message")
+                turns_before = [(turn.user, turn.assistant) for turn in agent.conversation_history]
+                
+                # A session for the same store started in the same second must not share the history file
+                other_agent = StoreManager().get_store_chatbot(store_name)
+                await other_agent.handle_query("Question from another session")
+                
+                if not agent.spill_if_idle(idle_seconds=0) or not agent.is_spilled or agent._store_sections is not None:
+                    self.test_results.append(("Session Spill", "FAILED", f"{store_name}: Session not spilled"))
+                    continue
+                
+                turns_after = [(turn.user, turn.assistant) for turn in agent.conversation_history]
+                if turns_after == turns_before:
+                    self.test_results.append(("Session Spill", "PASSED", f"{store_name}: Conversation restored after spill"))
+                else:
+                    self.test_results.append(("Session Spill", "FAILED", f"{store_name}: Restored conversation differs"))
+                
+                # Turns that never reached the history file must stay in memory
+                history_dir = agent.chat_histories_dir
+                agent.chat_histories_dir = os.path.join(history_dir, "missing_dir")
+                agent.conversation_history.append(ConversationTurn("Unsaved question", "Unsaved answer"))
+                agent.save_chat_history()
+                spilled = agent.spill_if_idle(idle_seconds=0)
+                agent.chat_histories_dir = history_dir
+                if spilled:
+                    self.test_results.append(("Session Spill", "FAILED", f"{store_name}: Unsaved turns were spilled"))
+                else:
+                    self.test_results.append(("Session Spill", "PASSED", f"{store_name}: Unsaved turns kept in memory"))
+        
+        except Exception as e:
+            self.test_results.append(("Session Spill", "ERROR", str(e)))
+
+    async def test_multi_store_query(self):
+        print("Testing Cross-Store Queries...")
+        try:
+            multi_store = MultiStoreQuery(self.store_manager)
+            scores = self.recommender.analyze_requirements("running shoes")
+            store_names = [rec["store_name"] for rec in self.recommender.recommend_stores(scores)]
+            
+            result = await multi_store.ask_all("Who has the cheapest running shoes?", store_names)
+            if len(result["results"]) != len(store_names):
+                self.test_results.append(("Cross-Store Query", "FAILED", "Missing store results"))
+            elif result["cheapest"] and result["cheapest"]["name"] == "Running Shoes":
+                self.test_results.append(("Cross-Store Query", "PASSED", f"Cheapest found at {result['cheapest']['store_name']}"))
+            else:
+                self.test_results.append(("Cross-Store Query", "WARNING", "No catalog match for running shoes"))
+            
+            # A word that only appears in an unrelated service's description must not make it a match
+            result = await multi_store.ask_all("Who has the cheapest professional haircut?", self.store_manager.list_stores())
+            if result["cheapest"] is None or "haircut" in result["cheapest"]["name"].lower():
+                self.test_results.append(("Cross-Store Query", "PASSED", "Partial keyword matches ignored"))
+            else:
+                self.test_results.append(("Cross-Store Query", "FAILED", f"Matched unrelated service {result['cheapest']}"))
+        
+        except Exception as e:
+            self.test_results.append(("Cross-Store Query", "ERROR", str(e)))
+
+    async def test_config_updates(self):
+        print("Testing Partial Config Updates...")
+        try:
+            stores = self.store_manager.list_stores()
+            for store_name in stores[:1]:  # Test with first store
+                agent = self.store_manager.get_store_chatbot(store_name)
+                service = agent.store_data["services"][0]
+                original_price = service["price"]
+                version_before = agent.store_version
+                
+                self.store_manager.update_service(store_name, service["name"], {"price": 1.23})
+                try:
+                    live_price = agent.store_data["services"][0]["price"]
+                    if agent.store_version == version_before + 1 and live_price == 1.23 and "1.23" in agent.build_prompt("price?"):
+                        self.test_results.append(("Config Update", "PASSED", f"{store_name}: Price change visible to live agent"))
+                    else:
+                        self.test_results.append(("Config Update", "FAILED", f"{store_name}: Live agent still has stale data"))
+                finally:
+                    self.store_manager.update_service(store_name, service["name"], {"price": original_price})
+                
+                # A config written by another process is picked up on the next refresh
+                config_path = os.path.join(self.store_manager.config_dir, f"{store_name}_config.json")
+                with open(config_path, 'r', encoding='utf-8') as f:
+                    config = json.load(f)
+                config["services"][0]["price"] = 4.56
+                with open(config_path, 'w', encoding='utf-8') as f:
+                    json.dump(config, f, indent=2)
+                os.utime(config_path, ns=(time.time_ns(), time.time_ns() + 1_000_000))
+                if agent.refresh_store_data() and agent.store_data["services"][0]["price"] == 4.56:
+                    self.test_results.append(("Config Update", "PASSED", f"{store_name}: External config change picked up"))
+                else:
+                    self.test_results.append(("Config Update", "FAILED", f"{store_name}: External config change missed"))
+                
+                # Recreating the store keeps the version increasing and updates live agents
+                version_before = agent.store_version
+                config["services"][0]["price"] = original_price
+                self.store_manager.create_store(store_name, config["store_info"], config["services"])
+                if agent.store_version == version_before + 1 and agent.store_data["services"][0]["price"] == original_price:
+                    self.test_results.append(("Config Update", "PASSED", f"{store_name}: Recreated store bumped version"))
+                else:
+                    self.test_results.append(("Config Update", "FAILED", f"{store_name}: Recreated store reset its version"))
+        
+        except Exception as e:
+            self.test_results.append(("Config Update", "ERROR", str(e)))
+
+    async def test_request_deadlines(self):
+        print("Testing Request Deadlines...")
+        try:
+            stores = self.store_manager.list_stores()
+            for store_name in stores[:1]:  # Test with first store
+                agent = self.store_manager.get_store_chatbot(store_name)
+                turns_before = len(agent.conversation_history)
+                
+                try:
+                    await agent.handle_query("What are your hours?", deadline=time.monotonic() - 1)
+                    self.test_results.append(("Request Deadline", "FAILED", f"{store_name}: Expired deadline was ignored"))
+                    continue
+                except DeadlineExceeded:
+                    pass
+                
+                if len(agent.conversation_history) == turns_before:
+                    self.test_results.append(("Request Deadline", "PASSED", f"{store_name}: Expired query left no partial turn"))
+                else:
+                    self.test_results.append(("Request Deadline", "FAILED", f"{store_name}: Expired query was recorded"))
+        
+        except Exception as e:
+            self.test_results.append(("Request Deadline", "ERROR", str(e)))
+
+    async def test_batch_eval(self):
+        print("Testing Batch Evaluation Resume...")
+        try:
+            stores = self.store_manager.list_stores()
+            for store_name in stores[:1]:  # Test with first store
+                with tempfile.TemporaryDirectory() as work_dir:
+                    input_path = os.path.join(work_dir, "queries.jsonl")
+                    output_path = os.path.join(work_dir, "results.jsonl")
+                    history_dir = os.path.join(work_dir, "histories")
+                    rows = [
+                        {"store": store_name, "session": "s1", "query": "What are your hours?"},
+                        {"store": store_name, "session": "s1", "query": "And your address?"},
+                        {"store": store_name, "session": "s2", "query": "What do you sell?"}
+                    ]
+                    with open(input_path, 'w', encoding='utf-8') as f:
+                        for row in rows:
+                            f.write(json.dumps(row) + "\n")
+                    
+                    # Previous run: row 1 answered, row 2 failed, row 3 fell back, then cut off mid-line
+                    seeded = [
+                        ("Seeded answer", None),
+                        (None, "TimeoutError: "),
+                        ("Fallback", "Agent returned the fallback response")
+                    ]
+                    with open(output_path, 'w', encoding='utf-8') as f:
+                        for line_no, (row, (response, error)) in enumerate(zip(rows, seeded), 1):
+                            f.write(json.dumps({"key": f"{line_no}:{store_name}", "line": line_no, "store": store_name,
+                                                "session": row["session"], "query": row["query"],
+                                                "response": response, "error": error, "elapsed_ms": 0.0}) + "\n")
+                        f.write('{"key": "2:')
+                    
+                    evaluator = BatchEvaluator(input_path, output_path, history_dir=history_dir)
+                    await evaluator.run()
+                    
+                    with open(output_path, 'r', encoding='utf-8') as f:
+                        results = [json.loads(line) for line in f]
+                    keys = [result["key"] for result in results]
+                    if (keys.count(f"1:{store_name}") == 1 and keys.count(f"2:{store_name}") == 2
+                            and keys.count(f"3:{store_name}") == 2):
+                        self.test_results.append(("Batch Eval", "PASSED", f"{store_name}: Completed rows skipped, failed rows retried"))
+                    else:
+                        self.test_results.append(("Batch Eval", "FAILED", f"{store_name}: Unexpected result keys {keys}"))
+                    
+                    # The retried turn must see the checkpointed answer as earlier context
+                    store_history_dir = os.path.join(history_dir, store_name)
+                    history_files = [name for name in os.listdir(store_history_dir)
+                                     if name.startswith(f"{store_name}_chat_eval_s1_")] if os.path.exists(store_history_dir) else []
+                    if not history_files:
+                        self.test_results.append(("Batch Eval", "WARNING", f"{store_name}: No eval history saved for s1"))
+                        continue
+                    history_path = os.path.join(store_history_dir, history_files[0])
+                    with open(history_path, 'r', encoding='utf-8') as f:
+                        conversation = json.load(f)["conversation"]
+                    if conversation and conversation[0]["assistant"] == "Seeded answer":
+                        self.test_results.append(("Batch Eval", "PASSED", f"{store_name}: Session context rebuilt on resume"))
+                    else:
+                        self.test_results.append(("Batch Eval", "FAILED", f"{store_name}: Session context not rebuilt"))
+        
+        except Exception as e:
+            self.test_results.append(("Batch Eval", "ERROR", str(e)))
+
     def print_test_results(self):
         print("\n=== Test Results ===\n")
         for test_name, status, message in self.test_results:
@@ -1,9 +1,23 @@
 from langchain.tools import Tool
 from langchain.agents import Tool
 from typing import Dict, List, Optional
+import asyncio
+import time
 import aiohttp
 from pydantic import BaseModel
 
+class DeadlineExceeded(Exception):
+    """Raised when a request runs past its deadline"""
+
+def remaining_time(deadline: Optional[float]) -> Optional[float]:
+    """Seconds left before a time.monotonic() deadline, or None if there is no deadline"""
+    if deadline is None:
+        return None
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise DeadlineExceeded("Request deadline exceeded")
+    return remaining
+
 class CartItem(BaseModel):
     service_name: str
     price: float
@@ -58,24 +72,36 @@ class RenkoTools:
         self.store_name = store_name
         self.api_base_url = api_base_url
         
-    async def check_availability(self, service_id: str, date: str) -> Dict:
+    def _session(self, deadline: Optional[float]) -> aiohttp.ClientSession:
+        """Create an HTTP session whose total timeout ends at the request deadline"""
+        if deadline is None:
+            return aiohttp.ClientSession()
+        return aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=remaining_time(deadline)))
+        
+    async def check_availability(self, service_id: str, date: str, deadline: Optional[float] = None) -> Dict:
         """Check service availability for a specific date"""
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.api_base_url}/stores/{self.store_name}/availability"
-            async with session.get(url, params={"service_id": service_id, "date": date}) as response:
-                return await response.json()
+        try:
+            async with self._session(deadline) as session:
+                url = f"{self.api_base_url}/stores/{self.store_name}/availability"
+                async with session.get(url, params={"service_id": service_id, "date": date}) as response:
+                    return await response.json()
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Availability check did not finish before the request deadline")
 
-    async def create_booking(self, service_id: str, date: str, user_id: str) -> Dict:
-        """Create a new booking"""
-        async with aiohttp.ClientSession() as session:
-            url = f"{self.api_base_url}/stores/{self.store_name}/bookings"
-            data = {
-                "service_id": service_id,
-                "date": date,
-                "user_id": user_id
-            }
-            async with session.post(url, json=data) as response:
-                return await response.json()
+    async def create_booking(self, service_id: str, date: str, user_id: str, deadline: Optional[float] = None) -> Dict:
+        """Create a new booking, if cancelled mid-request the booking may or may not exist"""
+        try:
+            async with self._session(deadline) as session:
+                url = f"{self.api_base_url}/stores/{self.store_name}/bookings"
+                data = {
+                    "service_id": service_id,
+                    "date": date,
+                    "user_id": user_id
+                }
+                async with session.post(url, json=data) as response:
+                    return await response.json()
+        except asyncio.TimeoutError:
+            raise DeadlineExceeded("Booking request did not finish before the request deadline")
 
     def get_tools(self) -> List[Tool]:
         """Return list of available tools for the agent"""
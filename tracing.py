@@ -0,0 +1,289 @@
+from contextlib import nullcontext
+from datetime import datetime
+from typing import Dict, Any, List, Optional
+import contextvars
+import cProfile
+import io
+import json
+import os
+import pstats
+import random
+import threading
+import time
+import tracemalloc
+import uuid
+
+# Shared no-op context returned whenever tracing is disabled or no trace is active
+_NULL_CONTEXT = nullcontext()
+
+_current_trace: contextvars.ContextVar = contextvars.ContextVar("renko_current_trace", default=None)
+_current_span: contextvars.ContextVar = contextvars.ContextVar("renko_current_span", default=None)
+
+
+def _env_flag(name: str) -> bool:
+    return os.getenv(name, "").lower() in ("1", "true", "yes", "on")
+
+
+def _env_float(name: str, default: Optional[float]) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return default
+    try:
+        return float(value)
+    except ValueError:
+        print(f"Invalid value for {name}: {value}")
+        return default
+
+
+class Span:
+    __slots__ = ("span_id", "parent_id", "name", "attributes", "start", "end", "error")
+
+    def __init__(self, span_id: int, parent_id: Optional[int], name: str, attributes: Dict[str, Any]):
+        self.span_id = span_id
+        self.parent_id = parent_id
+        self.name = name
+        self.attributes = attributes
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.error: Optional[str] = None
+
+    def to_dict(self, origin: float) -> Dict[str, Any]:
+        end = self.end if self.end is not None else time.perf_counter()
+        return {
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "name": self.name,
+            "start_ms": round((self.start - origin) * 1000, 3),
+            "duration_ms": round((end - self.start) * 1000, 3),
+            "attributes": self.attributes,
+            "error": self.error
+        }
+
+
+class RequestTrace:
+    def __init__(self, name: str, attributes: Dict[str, Any]):
+        """Collect the spans recorded while handling a single request"""
+        self.trace_id = uuid.uuid4().hex
+        self.name = name
+        self.attributes = attributes
+        self.started_at = datetime.now().isoformat()
+        self.start = time.perf_counter()
+        self.end: Optional[float] = None
+        self.spans: List[Span] = []
+        self.error: Optional[str] = None
+        self.profile: Optional[Dict[str, Any]] = None
+
+    @property
+    def duration_ms(self) -> float:
+        end = self.end if self.end is not None else time.perf_counter()
+        return (end - self.start) * 1000
+
+    def to_dict(self) -> Dict[str, Any]:
+        data = {
+            "trace_id": self.trace_id,
+            "name": self.name,
+            "started_at": self.started_at,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "error": self.error,
+            "spans": [span.to_dict(self.start) for span in self.spans]
+        }
+        if self.profile is not None:
+            data["profile"] = self.profile
+        return data
+
+
+class _SpanContext:
+    def __init__(self, trace: RequestTrace, name: str, attributes: Dict[str, Any]):
+        self.trace = trace
+        self.name = name
+        self.attributes = attributes
+        self.span: Optional[Span] = None
+        self.token = None
+
+    def __enter__(self) -> Span:
+        self.span = Span(len(self.trace.spans), _current_span.get(), self.name, self.attributes)
+        self.trace.spans.append(self.span)
+        self.token = _current_span.set(self.span.span_id)
+        return self.span
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.span.end = time.perf_counter()
+        if exc_type is not None:
+            self.span.error = f"{exc_type.__name__}: {exc}"
+        _current_span.reset(self.token)
+        return False
+
+
+class _ProfileSession:
+    """One process-wide cProfile and tracemalloc session, joined by every request profiled at the same time"""
+    # Both profilers see the whole process, so concurrent requests share a session instead of
+    # skipping profiling, and each kept profile also covers the other requests running meanwhile
+    _lock = threading.Lock()
+    _active = 0
+    _profile: Optional[cProfile.Profile] = None
+    _started_tracemalloc = False
+
+    @classmethod
+    def join(cls) -> bool:
+        """Start profiling, or join the running session, returns False if another profiling tool is active"""
+        with cls._lock:
+            if cls._active == 0:
+                profile = cProfile.Profile()
+                try:
+                    profile.enable()
+                except ValueError:
+                    return False
+                cls._profile = profile
+                cls._started_tracemalloc = not tracemalloc.is_tracing()
+                if cls._started_tracemalloc:
+                    tracemalloc.start()
+            cls._active += 1
+            return True
+
+    @classmethod
+    def leave(cls, keep: bool, top_n: int = 20) -> Optional[Dict[str, Any]]:
+        """Leave the session, building CPU and memory statistics only when the profile is kept"""
+        with cls._lock:
+            cls._active -= 1
+            profile = None
+            if keep:
+                # Collecting the stats disables the profiler, so resume it for requests still in the session
+                profile = cls._collect(top_n)
+                if cls._active:
+                    cls._profile.enable()
+            if cls._active == 0:
+                cls._profile.disable()
+                cls._profile = None
+                if cls._started_tracemalloc:
+                    tracemalloc.stop()
+                    cls._started_tracemalloc = False
+            return profile
+
+    @classmethod
+    def _collect(cls, top_n: int) -> Dict[str, Any]:
+        cls._profile.disable()
+        stats_stream = io.StringIO()
+        stats = pstats.Stats(cls._profile, stream=stats_stream)
+        stats.sort_stats("cumulative").print_stats(top_n)
+
+        current, peak = tracemalloc.get_traced_memory()
+        # Memory is only traced while the session runs, so live allocations are those made since it started
+        top_allocations = tracemalloc.take_snapshot().statistics("lineno")[:top_n]
+        return {
+            "cpu": stats_stream.getvalue(),
+            "memory": {
+                "traced_current_bytes": current,
+                "traced_peak_bytes": peak,
+                "top_allocations": [str(stat) for stat in top_allocations]
+            }
+        }
+
+
+class _TraceContext:
+    def __init__(self, tracer: "Tracer", name: str, attributes: Dict[str, Any]):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace: Optional[RequestTrace] = None
+        self.profiling = False
+        self.keep_profile = False
+        self.tokens = None
+
+    def __enter__(self) -> RequestTrace:
+        self.trace = RequestTrace(self.name, self.attributes)
+        self.tokens = (_current_trace.set(self.trace), _current_span.set(None))
+        self.keep_profile = self.tracer._sample_profile()
+        if self.keep_profile or self.tracer._take_slow_profile():
+            self.profiling = _ProfileSession.join()
+        return self.trace
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self.trace.end = time.perf_counter()
+        if exc_type is not None:
+            self.trace.error = f"{exc_type.__name__}: {exc}"
+        trace_token, span_token = self.tokens
+        _current_span.reset(span_token)
+        _current_trace.reset(trace_token)
+        is_slow = self.tracer._is_slow(self.trace)
+        if self.profiling:
+            self.trace.profile = _ProfileSession.leave(self.keep_profile or is_slow)
+        self.tracer._finish(self.trace, is_slow)
+        return False
+
+
+class Tracer:
+    def __init__(self,
+                 enabled: Optional[bool] = None,
+                 sample_rate: Optional[float] = None,
+                 profile_rate: Optional[float] = None,
+                 slow_threshold_ms: Optional[float] = None,
+                 profile_after_slow: Optional[int] = None,
+                 output_dir: Optional[str] = None):
+        """Configure request tracing, falling back to RENKO_* environment variables"""
+        self.enabled = _env_flag("RENKO_TRACING") if enabled is None else enabled
+        # Fraction of finished traces written to disk (slow traces are always written)
+        self.sample_rate = _env_float("RENKO_TRACE_SAMPLE_RATE", 1.0) if sample_rate is None else sample_rate
+        # Fraction of requests profiled with cProfile and tracemalloc
+        self.profile_rate = _env_float("RENKO_PROFILE_RATE", 0.0) if profile_rate is None else profile_rate
+        # Requests slower than this are always exported, and keep their profile when profiled
+        self.slow_threshold_ms = (_env_float("RENKO_PROFILE_SLOW_MS", None)
+                                  if slow_threshold_ms is None else slow_threshold_ms)
+        # Number of requests profiled after each slow one, so the threshold costs nothing until it is hit
+        self.profile_after_slow = (int(_env_float("RENKO_PROFILE_AFTER_SLOW", 10))
+                                   if profile_after_slow is None else profile_after_slow)
+        self._slow_profiles_left = 0
+        self.output_dir = output_dir or os.path.join(os.getcwd(), "traces")
+
+    def trace(self, name: str, **attributes):
+        """Start a request trace, or a child span if a trace is already active"""
+        if not self.enabled:
+            return _NULL_CONTEXT
+        if _current_trace.get() is not None:
+            return self.span(name, **attributes)
+        return _TraceContext(self, name, attributes)
+
+    def span(self, name: str, **attributes):
+        """Record a timed stage of the active request trace"""
+        trace = _current_trace.get()
+        if trace is None:
+            return _NULL_CONTEXT
+        return _SpanContext(trace, name, attributes)
+
+    def current_trace(self) -> Optional[RequestTrace]:
+        """Return the trace active in the current context, if any"""
+        return _current_trace.get()
+
+    def _sample_profile(self) -> bool:
+        return self.profile_rate > 0 and random.random() < self.profile_rate
+
+    def _is_slow(self, trace: RequestTrace) -> bool:
+        return self.slow_threshold_ms is not None and trace.duration_ms >= self.slow_threshold_ms
+
+    def _take_slow_profile(self) -> bool:
+        """Whether this request is one of those profiled after a slow request"""
+        # Unlocked, an occasional extra or missed profile under concurrency is harmless
+        if self._slow_profiles_left <= 0:
+            return False
+        self._slow_profiles_left -= 1
+        return True
+
+    def _finish(self, trace: RequestTrace, is_slow: bool):
+        """Export the trace if it is sampled, profiled or slow"""
+        if is_slow:
+            self._slow_profiles_left = self.profile_after_slow
+        if is_slow or trace.profile is not None or random.random() < self.sample_rate:
+            self.export(trace)
+
+    def export(self, trace: RequestTrace):
+        """Append a finished trace to the daily JSONL trace file"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        file_path = os.path.join(self.output_dir, f"traces_{datetime.now().strftime('%Y%m%d')}.jsonl")
+        try:
+            with open(file_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(trace.to_dict(), ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"Error exporting trace: {str(e)}")
+
+
+tracer = Tracer()